@@ -20,11 +20,24 @@ from __future__ import with_statement
 from __future__ import unicode_literals
 
 import logging
+import os
 import sqlite3
 
 from ._table import Table
 from ._field import NotSet
 
+
+_quoted_cols_cache = {}
+
+def _quoted_cols(fields):
+    """ Return the sqlite column list for a tuple of field names. """
+    try:
+        return _quoted_cols_cache[fields]
+    except KeyError:
+        cols = ', '.join('"{}"'.format(f) for f in fields)
+        _quoted_cols_cache[fields] = cols
+        return cols
+
 class Database(object):
     """ The main database class containing a list of tables.
     
@@ -60,18 +73,17 @@ class Database(object):
 
     def __init__(self):
         self._tables = set()
+        self._names = {}
+        self._tablenames = None
 
     def __contains__(self, t):
-        return t in self._tables or t in set(t.__name__ for t in self._tables)
+        return t in self._tables or t in self._names
 
     def __iter__(self):
         return iter(self._tables)
 
     def __getitem__(self, name):
-        for t in self._tables:
-            if t.__name__ == name:
-                return t
-        raise KeyError(name)
+        return self._names[name]
 
     def add(self, table):
         """ Add a `Table` class to the database.
@@ -86,10 +98,14 @@ class Database(object):
         ...     name = Field()
         """
         self._tables.add(table)
+        self._names[table.__name__] = table
+        self._tablenames = None
         return table
 
     def tablenames(self):
-        return [t.__name__ for t in self._tables]
+        if self._tablenames is None:
+            self._tablenames = tuple(t.__name__ for t in self._tables)
+        return list(self._tablenames)
 
     def reset(self):
         """ Delete all records from all tables. """
@@ -104,34 +120,46 @@ class Database(object):
         are stored as an integer id (referring to another record). Each
         record has an additional field, '_oid_', which contains a unique
         integer.
+        
+        If *filename* already exists, only the tables belonging to this
+        database are replaced and any others are left as they are.
         """
-        conn = sqlite3.connect(filename)
+        def build_row(record, fields):
+            values = [id(record)]
+            for fname in fields:
+                value = getattr(record, fname)
+                if isinstance(value, Table):
+                    value = id(value)
+                elif value is NotSet:
+                    value = 0
+                elif value is not None:
+                    value = unicode(value)
+                values.append(value)
+            return values
+
+        # Transactions are managed explicitly.  Durability is only traded
+        # for speed in a new file, where a crash cannot damage anything
+        # other than the dump itself.
+        new_file = not os.path.exists(filename)
+        conn = sqlite3.connect(filename, isolation_level=None)
+        if new_file:
+            conn.execute('PRAGMA journal_mode=MEMORY;')
+            conn.execute('PRAGMA synchronous=OFF;')
         conn.execute('BEGIN;')
         for table in self:
             tname = table.__name__
-            fstr = ['"{}"'.format(f) for f in table.fields()]
-            fstr = '"_oid_", ' + ', '.join(fstr)
+            fields = table.fields()
+            fstr = '"_oid_", ' + _quoted_cols(fields)
             try:
                 conn.execute('DROP TABLE "{}"'.format(tname))
             except sqlite3.OperationalError:
                 pass
             query = 'CREATE TABLE "{}" ({});\n'.format(tname, fstr)
             conn.execute(query)
-            for record in table:
-                values = [id(record)]
-                for fname in table.fields():
-                    value = getattr(record, fname)
-                    if isinstance(value, Table):
-                        value = id(value)
-                    elif value is NotSet:
-                        value = 0
-                    elif value is not None:
-                        value = unicode(value)
-                    values.append(value)
-                qmarks = ', '.join('?' * len(values))
-                query = 'INSERT INTO "{}" VALUES ({})'.format(tname, qmarks)
-                conn.execute(query, values)
-        conn.commit()
+            qmarks = ', '.join('?' * (len(fields) + 1))
+            query = 'INSERT INTO "{}" VALUES ({})'.format(tname, qmarks)
+            conn.executemany(query, (build_row(r, fields) for r in table))
+        conn.execute('COMMIT;')
         conn.close()
 
     def fromsqlite(self, filename):
@@ -151,7 +179,6 @@ class Database(object):
             and a message logged.
         """
         conn = sqlite3.connect(filename)
-        conn.row_factory = sqlite3.Row
         # Extract the sql to a temporary dict structure, keyed by oid
         flat = {}
         for table in self:
@@ -162,38 +189,40 @@ class Database(object):
             except sqlite3.OperationalError:
                 logging.warning("Table '{}' not found".format(tname))
             else:
-                for row in cursor:
-                    row = dict(row)
-                    print row
-                    if '_oid_' in row:
+                cols = [d[0] for d in cursor.description]
+                if '_oid_' in cols:
+                    for row in cursor.fetchall():
+                        row = dict(zip(cols, row))
                         oid = row.pop('_oid_')
                         flat[oid] = (table, row)
 
         # Create correct types in flat
+        fieldsets = dict((table, frozenset(table.fields())) for table in self)
         for oid in flat.keys():
-            self._makerecord(flat, oid)
+            self._makerecord(flat, oid, fieldsets)
 
-    def _makerecord(self, flat, oid):
+    def _makerecord(self, flat, oid, fieldsets):
         """ Create a new record for oid and return it. """
         table, row = flat[oid]
-        if isinstance(row, table):
+        if type(row) is table:
             return row
-        keys = set(table.fields()) & set(row.keys())
+        fieldset = fieldsets[table]
         args = {}
-        for key in keys:
-            if isinstance(row[key], int):
-                if row[key] == 0:
+        for (key, value) in row.items():
+            if key not in fieldset:
+                continue
+            if isinstance(value, int):
+                if value == 0:
                     args[key] = NotSet
                 else:
-                    args[key] = self._makerecord(flat, row[key])
+                    args[key] = self._makerecord(flat, value, fieldsets)
             else:
-                args[key] = row[key]
+                args[key] = value
 
         record = None
         try:
             record = table(**args)
         except ValueError as err:
-            print "zzz"
             logging.warning(err)
         else:
             flat[oid] = (table, record)
@@ -20,80 +20,256 @@ from __future__ import with_statement
 from __future__ import unicode_literals
 from pprint import pprint
 
-import uuid
+import binascii
+import collections
 import logging
-import re
+import os
 import simplejson
-from norman.tools import u
+from norman.tools import u, string_types
 from norman._field import NotSet
 from norman._table import Table
 
 
+_HEX = frozenset('0123456789abcdefABCDEF')
+_UUID_CHARS = _HEX | frozenset('-')
+
+
+def _is_uuid(s):
+    """ Return `True` if *s* is a canonical, hyphenated UUID string. """
+    # Cheap layout test first, then a character class test done in C:
+    # with exactly four hyphens in the right places, everything else
+    # must be a hex digit.
+    if len(s) != 36:
+        return False
+    if s[8] != '-' or s[13] != '-' or s[18] != '-' or s[23] != '-':
+        return False
+    return s.count('-') == 4 and _UUID_CHARS.issuperset(s)
+
+
+def _random_uuid_bytes():
+    """ Return 16 random bytes with version 4 UUID bits set. """
+    b = bytearray(os.urandom(16))
+    b[6] = (b[6] & 0x0F) | 0x40
+    b[8] = (b[8] & 0x3F) | 0x80
+    return b
+
+
+def _format_uuid(b):
+    """ Format 16 raw bytes as a hyphenated UUID string. """
+    h = binascii.hexlify(b).decode('ascii')
+    return '%s-%s-%s-%s-%s' % (h[0:8], h[8:12], h[12:16], h[16:20], h[20:32])
+
+
+def _fast_uuid4():
+    """ Return a random (version 4) UUID string.
+
+    This is equivalent to ``u(uuid.uuid4())``, but formats the random bytes
+    directly rather than going through a `uuid.UUID` instance.
+    """
+    return _format_uuid(_random_uuid_bytes())
+
+
+class _UUIDPool(object):
+    """ Random UUIDs stored as 16 raw bytes each in a single buffer.
+
+    This takes a fraction of the memory of keeping the formatted strings,
+    which are only produced on demand by `format`.
+    """
+
+    def __init__(self):
+        self._pool = bytearray()
+
+    def new(self):
+        """ Add a random UUID to the pool and return its index. """
+        self._pool += _random_uuid_bytes()
+        return len(self._pool) // 16 - 1
+
+    def format(self, index):
+        """ Return the UUID string at *index*. """
+        start = index * 16
+        return _format_uuid(memoryview(self._pool)[start:start + 16])
+
+
+def _json_dumps(obj):
+    """ Serialize *obj* to JSON bytes with sorted keys. """
+    return simplejson.dumps(obj, sort_keys=True).encode('utf-8')
+
+
 class DBConnector(object):
     """
     Basic class for DB export-import connector
     """
     __UUID_FIELD_LENGTH = 36
-    __UUID_REGEXP = re.compile('^[\w]{8}-[\w]{4}-[\w]{4}-[\w]{4}-[\w]{12}$')
 
     def __init__(self, db, *args, **kwargs):
         self.db = db
 
-    def __import_record(self, records_list, record_uuid):
+    def __split_record(self, records_list, record):
         """
-        Import one record from native structure
+        Split a native record into constructor arguments and references
+        to other records, keyed by field name
         """
-        # if record was already inserted
-        if isinstance(records_list[record_uuid], Table):
-            return records_list[record_uuid]
-
-        record = records_list[record_uuid]
-        table = record["_table_"]
-
-        keys = set(table.fields()) & set(record.keys())
-
         args = {}
-        for key in keys:
-            if isinstance(record[key], int):
-                if record[key] == 0:
-                    args[key] = NotSet
+        refs = {}
+        fieldset = record["_fieldset_"]
+        uuid_length = self.__UUID_FIELD_LENGTH
+        for (key, value) in record.items():
+            if key not in fieldset:
+                continue
+            if isinstance(value, Table):
+                args[key] = value
+            elif isinstance(value, int):
+                args[key] = NotSet if value == 0 else value
+            elif isinstance(value, string_types)\
+              and len(value) == uuid_length\
+              and value in records_list\
+              and _is_uuid(value):
+                refs[key] = value
             else:
-                #check for UUID in value
-                if len(record[key]) == self.__UUID_FIELD_LENGTH\
-                  and self.__UUID_REGEXP.match(record[key])\
-                  and record[key] in records_list.keys():
-                    args[key] = self.__import_record(records_list, record[key])
-                else:
-                    args[key] = record[key]
+                args[key] = value
+        return args, refs
+
+    def __import_record(self, records_list, record_uuid, args, refs):
+        """
+        Import one record from native structure, all referenced records
+        must already be imported
+        """
+        record = records_list[record_uuid]
+        for (key, ref) in refs.items():
+            args[key] = records_list[ref]
 
         # gen uuid field
-        if '_uuid_' in table.fields():
+        if '_uuid_' in record["_fieldset_"]:
             args['_uuid_'] = record_uuid
 
-        inserted_record = table(**args)
+        inserted_record = record["_table_"](**args)
         records_list[record_uuid] = inserted_record
         return inserted_record
 
     def __import_native(self, native):
         """ Create DB enteties from native python dict-list structure """
         existing_tables = dict()
+        field_sets = dict()
         for table in self.db:
             existing_tables[table.__name__] = table
+            field_sets[table] = frozenset(table.fields())
 
         records_list = dict()
         for (table_name, records) in native.items():
             table = existing_tables.get(table_name.capitalize(), None)
             if table is not None:
                 for record in records:
-                    if '_uuid_' in record.keys():
+                    if '_uuid_' in record:
                         record_uuid = record.pop('_uuid_')
                     else:
-                        record_uuid = u(uuid.uuid4())
+                        record_uuid = _fast_uuid4()
                     record['_table_'] = table
+                    record['_fieldset_'] = field_sets[table]
                     records_list[record_uuid] = record
 #        pprint(records_list)
+
+        # Records are created in dependency order: each one as soon as all
+        # the records it refers to exist.  Reference cycles are broken by
+        # creating one of their records without the references to records
+        # which do not exist yet, and setting those once everything exists.
+        pending = {}
+        waiting = {}
+        dependents = collections.defaultdict(list)
+        ready = []
         for (record_uuid, record) in records_list.items():
-            self.__import_record(records_list, record_uuid)
+            args, refs = self.__split_record(records_list, record)
+            pending[record_uuid] = (args, refs)
+            required = set(refs.values())
+            waiting[record_uuid] = len(required)
+            for ref in required:
+                dependents[ref].append(record_uuid)
+            if not required:
+                ready.append(record_uuid)
+
+        # Cycles are broken at the first record still pending in this
+        # order; the cursor only moves forward, so finding it is O(1)
+        # amortised over the whole import.
+        order = list(pending)
+        cursor = 0
+        deferred = []
+        while pending:
+            if ready:
+                record_uuid = ready.pop()
+                args, refs = pending.pop(record_uuid)
+            else:
+                while order[cursor] not in pending:
+                    cursor += 1
+                record_uuid = order[cursor]
+                args, refs = pending.pop(record_uuid)
+                missing = dict((key, ref) for (key, ref) in refs.items()
+                               if ref in pending or ref == record_uuid)
+                refs = dict((key, ref) for (key, ref) in refs.items()
+                            if key not in missing)
+                deferred.append((record_uuid, missing))
+            self.__import_record(records_list, record_uuid, args, refs)
+            for dependent in dependents.pop(record_uuid, ()):
+                waiting[dependent] -= 1
+                if waiting[dependent] == 0 and dependent in pending:
+                    ready.append(dependent)
+
+        for (record_uuid, refs) in deferred:
+            record = records_list[record_uuid]
+            for (key, ref) in refs.items():
+                setattr(record, key, records_list[ref])
+
+    def _iter_native(self):
+        """
+        Iterate over the db representation as (tablename, records) pairs,
+        where records is an iterator over the record dicts described in
+        `__export_native`.  Records are built only as they are consumed,
+        so each records iterator should be exhausted before moving on.
+        """
+
+        # Maps object ids to either an index into uuid_pool for generated
+        # UUIDs, or the object's own _uuid_ string
+        oid_uuid_bijection = {}
+        uuid_pool = _UUIDPool()
+
+        # There is only plase this function is used so no separate method needed
+        def get_uuid_for_object(object):
+            """ Recieve object and determine its UUID or assign it"""
+            oid = id(object)
+            object_uuid = oid_uuid_bijection.get(oid)
+            if object_uuid is None:
+                object_uuid = getattr(object, '_uuid_', None)
+                if object_uuid:
+                    object_uuid = u(object_uuid)
+                else:
+                    object_uuid = uuid_pool.new()
+                oid_uuid_bijection[oid] = object_uuid
+            if isinstance(object_uuid, int):
+                return uuid_pool.format(object_uuid)
+            return object_uuid
+
+        def iter_records(table):
+            fields = table.fields()
+            for record in table:
+                values = [None] * len(fields)
+                for (i, fname) in enumerate(fields):
+                    value = getattr(record, fname)
+                    if isinstance(value, Table):
+                        values[i] = get_uuid_for_object(value)
+                    elif value is NotSet:
+                        values[i] = 0
+                    elif value is not None:
+                        # force unicode conversion
+                        values[i] = u(value)
+                # building from pairs sizes the dict once
+                record_content = dict(zip(fields, values))
+                record_content['_uuid_'] = get_uuid_for_object(record)
+                yield record_content
+
+        # Iterate over tables and records, converting them to dict-list structure
+        for table in sorted(self.db, key=lambda t: t.__name__.lower()):
+            # Table presented as class, but in most DB naming conventions
+            # capitalized table names is unnormal,
+            # so it will be capitalized back on import
+            yield table.__name__.lower(), iter_records(table)
 
     def __export_native(self):
         """
@@ -114,42 +290,9 @@ class DBConnector(object):
         Keys is presented as _uuid_ fields of each serialized object.
         Foreign keys also provided as UUIDs.
         """
-
-        oid_uuid_bijection = {}
-
-        # There is only plase this function is used so no separate method needed
-        def get_uuid_for_object(object):
-            """ Recieve object and determine its UUID or assign it"""
-            oid = id(object)
-            if oid not in oid_uuid_bijection.keys():
-                if "_uuid_" in object._fields and object._uuid_:
-                    oid_uuid_bijection[oid] = object._uuid_
-                else:
-                    oid_uuid_bijection[oid] = u(uuid.uuid4())
-            return oid_uuid_bijection[oid]
-
-        # Iterate over tables and records, converting them to dict-list structure
         result = {}
-        for table in self.db:
-            table_content = []
-            for record in table:
-                record_content = dict(_uuid_=get_uuid_for_object(record))
-                for fname in table.fields():
-                    value = getattr(record, fname)
-                    if isinstance(value, Table):
-                        value = get_uuid_for_object(value)
-                    elif value is NotSet:
-                        value = 0
-                    elif value is not None:
-                        # force unicode conversion
-                        value = u(value)
-                    record_content[fname] = value
-
-                table_content.append(record_content)
-                # Table presented as class, but in most DB naming conventions
-                # capitalized table names is unnormal,
-                # so it will be capitalized back on import
-            result[table.__name__.lower()] = table_content
+        for (table_name, records) in self._iter_native():
+            result[table_name] = list(records)
         return result
 
     def import_dump(self, dump):
@@ -169,7 +312,22 @@ class JsonDBConnector(DBConnector):
         return super(JsonDBConnector, self).import_dump(loaded_dump)
 
     def export_dump(self):
-        native_dump = super(JsonDBConnector, self).export_dump()
-#        pprint(native_dump)
-        return simplejson.dumps(native_dump, sort_keys=True, indent=4)
-
+        # Records are serialized one at a time, so the whole database is
+        # never held as native structure and JSON at the same time.
+        buf = bytearray(b'{')
+        table_sep = b'\n'
+        for (table_name, records) in self._iter_native():
+            buf += table_sep
+            buf += _json_dumps(table_name)
+            buf += b': ['
+            record_sep = b'\n'
+            for record in records:
+                buf += record_sep
+                buf += _json_dumps(record)
+                record_sep = b',\n'
+            buf += b'\n]'
+            table_sep = b',\n'
+        buf += b'\n}'
+        # simplejson escapes non-ASCII characters, so the output is a plain
+        # str as before, without a wide unicode copy of the whole dump
+        return bytes(buf)
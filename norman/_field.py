@@ -21,8 +21,11 @@ from __future__ import with_statement
 from __future__ import unicode_literals
 
 class NotSet(object):
+    __slots__ = ()
+
     def __nonzero__(self): # notice: 3k __bool__ was replaced to __nonzero__
         return False
+    __bool__ = __nonzero__
 
 
 # Senitinal indicating that the field value has not yet been set.
@@ -64,21 +67,17 @@ class Field(object):
     by `Field` directly.  It is the responsibility of the table to
     implement the necessary constraints and indexes.
     """
+    __slots__ = ('unique', 'index', 'default', 'readonly', 'name')
 
-    def __init__(self, **_3to2kwargs): # notice: here was a huge rewrite, that i took form 3to2 output
-        if 'readonly' in _3to2kwargs: readonly = _3to2kwargs['readonly']; del _3to2kwargs['readonly']
-        else: readonly = False
-        if 'default' in _3to2kwargs: default = _3to2kwargs['default']; del _3to2kwargs['default']
-        else: default = NotSet
-        if 'index' in _3to2kwargs: index = _3to2kwargs['index']; del _3to2kwargs['index']
-        else: index = False
-        if 'unique' in _3to2kwargs: unique = _3to2kwargs['unique']; del _3to2kwargs['unique']
-        else: unique = False
-        self.unique = unique
-        self.index = index or unique
-        self.default = default
-        self.readonly = readonly
-        self._data = {}
+    def __init__(self, **kwargs): # notice: emulates the keyword-only arguments below
+        self.unique = unique = kwargs.pop('unique', False)
+        self.index = kwargs.pop('index', False) or unique
+        self.default = kwargs.pop('default', NotSet)
+        self.readonly = kwargs.pop('readonly', False)
+        if kwargs:
+            raise TypeError("__init__() got an unexpected keyword argument "
+                            "'{}'".format(sorted(kwargs)[0]))
+        self.name = None
 
 #    def __init__(self, *, unique=False, index=False, default=NotSet,
 #                 readonly=False):
@@ -89,15 +88,26 @@ class Field(object):
 #        self._data = {}
 
     def __get__(self, instance, owner):
-        if instance is None:
-            return self
-        else:
-            return self._data.get(instance, self.default)
+        # Reading a set value is by far the most common case, so it is
+        # tried first and the class access and default are handled as
+        # exceptions.
+        try:
+            return instance._values[self.name]
+        except AttributeError:
+            if instance is None:
+                return self
+            raise
+        except KeyError:
+            return self.default
+
+    def __set__(self, instance, value, _NOTSET=NotSet):
+        """ Set a value for an instance.
 
-    def __set__(self, instance, value):
-        """ Set a value for an instance."""
+        Values are stored in the instance's ``_values`` dict, keyed by
+        field name.
+        """
         if (self.readonly and
-            self.__get__(instance, instance.__class__) is not NotSet):
+            instance._values.get(self.name, self.default) is not _NOTSET):
             raise TypeError('Field is read only')
-        self._data[instance] = value
+        instance._values[self.name] = value
 
@@ -19,11 +19,13 @@
 from __future__ import with_statement
 from __future__ import unicode_literals
 
+from .tools import intern_name
+
 class Group(object):
 
     def __init__(self, table, matcher=None, **kwargs):
         self._matcher = matcher
-        self._kw = kwargs
+        self._kw = dict((intern_name(k), v) for k, v in kwargs.items())
         self._table = table
 
     def __get__(self, instance, owner):
@@ -36,25 +38,33 @@ class Group(object):
 
     def _getkw(self, kwargs=None):
         'Return the final kwargs to use'
+        if self._matcher is None:
+            # The result is constant, so the group's own kwargs can be
+            # shared as long as callers do not modify them.
+            if kwargs is None:
+                return self._kw
+            kwargs.update(self._kw)
+            return kwargs
         if kwargs is None:
             kwargs = {}
         kwargs.update(self._kw)
-        if self._matcher is not None:
-            kw = self._matcher(self._instance)
-            kwargs.update(kw)
+        kw = self._matcher(self._instance)
+        kwargs.update(kw)
         return kwargs
 
     def __iter__(self):
         return self._table.iter(**self._getkw())
 
     def __contains__(self, record):
+        if record not in self._table:
+            return False
         for k, v in self._getkw().items():
             if getattr(record, k) != v:
                 return False
-        return record in self._table
+        return True
 
     def __len__(self):
-        return len(self._table.get(**self._getkw()))
+        return self._table.count(**self._getkw())
 
     def contains(self, **kwargs):
         return self._table.contains(**self._getkw(kwargs))
@@ -20,22 +20,12 @@ from __future__ import with_statement
 from __future__ import unicode_literals
 
 import collections
-import copy
-import functools
-import weakref
-
-if hasattr(weakref, 'WeakSet'):
-        WeakSet = weakref.WeakSet
-else:
-		# Pyhon 2.6 weakref expernal library
-        import weakrefset
-        WeakSet = weakrefset.WeakSet
+import itertools
 
 from ._field import Field, NotSet
+from .tools import intern_name
 
-class _I:
-    """ An empty, hashable and weak referenceable object."""
-    pass
+_EMPTY = frozenset()
 
 
 class TableMeta(type):
@@ -46,7 +36,7 @@ class TableMeta(type):
     
     Tables support a limited sequence-like interface, but support rapid
     lookup through indexes.  Internally, each record is stored in a dict
-    with random numerical keys.  Indexes simply map record attributes to keys.
+    with sequential integer keys.  Indexes simply map record attributes to keys.
     """
 
     def __new__(mcs, name, bases, cdict): # notice: first param replaced to conventional mcs
@@ -54,18 +44,24 @@ class TableMeta(type):
         cls._instances = {}
         cls._indexes = {}
         cls._fields = {}
+        cls._keys = itertools.count()
+        cls._plans = {}
         # notice: db declaration with metaclass param suppressed
 #        if database is not None:
 #            database._tables.add(cls)
-        fulldict = copy.copy(cdict)
-        for base in bases:
-            fulldict.update(base.__dict__)
+        fulldict = {}
+        for klass in reversed(cls.__mro__):
+            fulldict.update(vars(klass))
         for name, value in fulldict.items():
             if isinstance(value, Field):
+                name = intern_name(name)
                 value.name = name
                 cls._fields[name] = value
                 if value.index:
-                    cls._indexes[name] = collections.defaultdict(WeakSet)
+                    cls._indexes[name] = collections.defaultdict(set)
+        cls._unique_fields = tuple(n for n, f in cls._fields.items() if f.unique)
+        cls._blank = dict.fromkeys(cls._fields, NotSet)
+        cls._fieldnames = tuple(cls._fields)
         return cls
 
     # notice: db declaration with __database__ member instead metaclass param
@@ -78,26 +74,60 @@ class TableMeta(type):
         return len(cls._instances)
 
     def __contains__(cls, record):
-        return record._key in cls._instances
+        # Keys are only unique within a table, so check the record itself
+        return cls._instances.get(record._key) is record
 
     def __iter__(cls):
         return iter(cls._instances.values())
 
+    def _plan(cls, kwargs):
+        """ Split the keys of *kwargs* into indexed and unindexed names.
+
+        The result only depends on which keys are given, so it is cached.
+        """
+        keyset = frozenset(kwargs)
+        plan = cls._plans.get(keyset)
+        if plan is None:
+            indexed = tuple(k for k in keyset if k in cls._indexes)
+            remaining = tuple(k for k in keyset if k not in cls._indexes)
+            plan = cls._plans[keyset] = (indexed, remaining)
+        return plan
+
     def iter(cls, **kwargs):
         """ A generator which iterates over records matching kwargs."""
-        keys = set(kwargs.keys()) & set(cls._indexes.keys())
-        if keys:
-            f = lambda a, b: a & b
-            matches = functools.reduce(f, (cls._indexes[key][kwargs[key]] for key in keys))
-            matches = [cls._instances[k] for k in matches if k in cls._instances]
+        indexed, remaining = cls._plan(kwargs)
+        if indexed:
+            # Intersect starting from the smallest bucket
+            buckets = sorted((cls._indexes[key].get(kwargs[key], _EMPTY)
+                              for key in indexed), key=len)
+            matches = buckets[0].intersection(*buckets[1:])
+            matches = (cls._instances[k] for k in matches
+                       if k in cls._instances)
         else:
             matches = cls._instances.values()
-        for m in matches:
-            if all(getattr(m, k) == v for k, v in kwargs.items()):
+        if not remaining:
+            # The index lookup is already exact
+            for m in matches:
                 yield m
+        else:
+            remaining = [(k, kwargs[k]) for k in remaining]
+            for m in matches:
+                if all(getattr(m, k) == v for k, v in remaining):
+                    yield m
 
     def contains(cls, **kwargs):
         """ Return `True` if the table contains any records matching *kwargs*."""
+        indexed, remaining = cls._plan(kwargs)
+        if indexed and not remaining:
+            # Answered from the indexes alone, without touching any records.
+            # Only the smallest bucket is scanned, and that stops at the
+            # first key which is in all the others.
+            buckets = sorted((cls._indexes[k].get(kwargs[k], _EMPTY)
+                              for k in indexed), key=len)
+            instances = cls._instances
+            rest = buckets[1:]
+            return any(k in instances and all(k in b for b in rest)
+                       for k in buckets[0])
         it = cls.iter(**kwargs)
         try:
             next(it)
@@ -109,6 +139,10 @@ class TableMeta(type):
         """ Return a set of all records matching *kwargs*."""
         return set(cls.iter(**kwargs))
 
+    def count(cls, **kwargs):
+        """ Return the number of records matching *kwargs*."""
+        return sum(1 for r in cls.iter(**kwargs))
+
     def delete(cls, records=None, **keywords):
         """ Delete records from the table.
         
@@ -148,11 +182,16 @@ class TableMeta(type):
         table is cleared.
         """
         if records is None:
-            records = cls.iter()
-        if isinstance(records, Table):
-            records = set([records])
-        kwmatch = cls.iter(**keywords)
-        rec = set(records) & set(kwmatch)
+            # Matches come straight from the table, so need no filtering
+            rec = list(cls.iter(**keywords))
+        else:
+            if isinstance(records, Table):
+                records = [records]
+            items = keywords.items()
+            # Membership is tested as each record is reached, so records
+            # listed twice are only deleted once
+            rec = (r for r in records if r in cls
+                   and all(getattr(r, k) == v for k, v in items))
         for r in rec:
             try:
                 r.validate_delete()
@@ -162,11 +201,64 @@ class TableMeta(type):
                 raise
             else:
                 del cls._instances[r._key]
+                r._dropindex()
 
 
     def fields(cls):
-        """ Return an iterator over field names in the table. """
-        return cls._fields.keys()
+        """ Return a tuple of field names in the table. """
+        return cls._fieldnames
+
+    def _bulk(cls, rows, validate=True):
+        """ Create a record from each dict of field values in *rows*.
+
+        This is a fast path for loading many records.  Values are stored
+        directly instead of going through `Table.__setattr__` for each field,
+        and each record is indexed in a single pass.  Unique fields are
+        still checked, and `Table.validate` is called once per record unless
+        *validate* is `False`.  A list of the new records is returned.
+
+        Loading is atomic: if any row fails, the records already created by
+        this call are removed again before the error is raised.
+        """
+        fields = cls._fields
+        blank = cls._blank
+        indexes = cls._indexes.items()
+        uniques = cls._unique_fields
+        instances = cls._instances
+        records = []
+        try:
+            for row in rows:
+                badkw = set(row).difference(fields)
+                if badkw:
+                    raise AttributeError(badkw)
+                values = blank.copy()
+                values.update(row)
+                if uniques and any(values[f] is not NotSet for f in uniques):
+                    if cls.contains(**dict((f, values[f]) for f in uniques)):
+                        raise ValueError("Not unique: {}".format(
+                            ', '.join('{}={}'.format(f, repr(values[f]))
+                                      for f in uniques)))
+                record = cls.__new__(cls)
+                key = next(cls._keys)
+                record._key = key
+                record._values = values
+                record._initializing = False
+                for name, index in indexes:
+                    index[values[name]].add(key)
+                if validate:
+                    try:
+                        record.validate()
+                    except Exception:
+                        record._dropindex()
+                        raise
+                instances[key] = record
+                records.append(record)
+        except Exception:
+            for record in records:
+                del instances[record._key]
+                record._dropindex()
+            raise
+        return records
 
 
 class Table():
@@ -176,63 +268,102 @@ class Table():
     This class should be inherited from to define the fields in the table.
     It may also optionally provide a `validate` method.
     """
+    __slots__ = ('_key', '_values', '_initializing', '__weakref__')
+
     def __init__(self, **kwargs):
-        key = _I()
+        cls = type(self)
+        key = next(cls._keys)
         self._key = key
-        data = dict.fromkeys(self.__class__.fields(), NotSet)
-        badkw = set(kwargs.keys()) - set(data.keys())
+        badkw = set(kwargs).difference(self._fields)
         if badkw:
             raise AttributeError(badkw)
-        data.update(kwargs)
-        validate = self.validate
-        self.validate = lambda: None
+        # All fields start out as NotSet, so that setting the ones missing
+        # from kwargs below only has to update the indexes.
+        self._values = self._blank.copy()
+        # Validation is suppressed until all fields have been set
+        self._initializing = True
         try:
-            for k, v in data.items():
-                setattr(self, k, v)
-        finally:
-            self.validate = validate
-        self.validate()
+            try:
+                for k in self._fieldnames:
+                    if k in kwargs:
+                        setattr(self, k, kwargs[k])
+                    else:
+                        self._set_initial(k, NotSet)
+            finally:
+                self._initializing = False
+            self.validate()
+        except Exception:
+            # The record is never added, so it should not be indexed either
+            self._dropindex()
+            raise
         self._instances[key] = self
 
     def __setattr__(self, attr, value):
-        try:
-            field = getattr(self.__class__, attr)
-        except AttributeError:
-            field = None
-        if isinstance(field, Field):
+        field = type(self)._fields.get(attr)
+        if field is not None:
             oldvalue = getattr(self, attr)
             # To avoid endless recursion if validate changes a value
             if oldvalue != value:
                 field.__set__(self, value)
                 if field.unique:
-                    table = self.__class__
-                    uniques = dict((f, getattr(self, f)) for f in table.fields()
-                                   if getattr(table, f).unique)
+                    uniques = dict((f, getattr(self, f))
+                                   for f in self._unique_fields)
                     existing = set(self.__class__.iter(**uniques)) - set([self])
                     if existing:
+                        # Restore the old value directly, so that the index
+                        # (not updated yet) stays consistent with it
+                        self._values[attr] = oldvalue
                         raise ValueError("Not unique: {}={}".format(field.name,
                                                                 repr(value)))
                 try:
-                    self.validate()
+                    if not self._initializing:
+                        self.validate()
                 except Exception as err:
+                    current = self._values[attr]
                     field.__set__(self, oldvalue)
+                    # validate may have changed and indexed the value
+                    if field.index and current != value:
+                        self._updateindex(attr, current, oldvalue)
                     if isinstance(err, AssertionError):
                         raise ValueError(*err.args)
                     else:
                         raise
             if field.index:
-                self._updateindex(attr, oldvalue, value)
+                # Index the value actually stored, which validate may have
+                # changed (and already indexed) through a nested write
+                self._updateindex(attr, oldvalue, self._values[attr])
         else:
             super(Table, self).__setattr__(attr, value)
 
+    def _set_initial(self, attr, value):
+        """ Set a field on a new record, bypassing unique checks and validate.
+
+        This is only safe for values which cannot clash, such as `NotSet`.
+        """
+        self._values[attr] = value
+        index = self._indexes.get(attr)
+        if index is not None:
+            index[value].add(self._key)
+
     def _updateindex(self, name, oldvalue, newvalue):
         index = self._indexes[name]
-        try:
-            index[oldvalue].remove(self._key)
-        except KeyError:
-            pass
+        keys = index.get(oldvalue)
+        if keys is not None:
+            keys.discard(self._key)
+            if not keys:
+                del index[oldvalue]
         index[newvalue].add(self._key)
 
+    def _dropindex(self):
+        """ Remove the record from all indexes of its table. """
+        for name, index in self._indexes.items():
+            value = getattr(self, name)
+            keys = index.get(value)
+            if keys is not None:
+                keys.discard(self._key)
+                if not keys:
+                    del index[value]
+
     def validate(self):
         """ Raise an exception of the record contains invalid data.
         
@@ -22,13 +22,32 @@ from __future__ import unicode_literals
 import sys
 if sys.version < '3':
     import codecs
+    string_types = basestring
     def u(x):
         """ Unicode string for python 2.x """
+        if isinstance(x, unicode):
+            return x
+        if isinstance(x, bytes):
+            return x.decode('utf-8')
         return unicode(x)
+    intern = intern
 else:
+    string_types = str
     def u(x):
         """ Unicode string for python 3k """
         return x
+    from sys import intern
+
+
+def intern_name(name):
+    """ Intern *name* if it is a native string, otherwise return it as is.
+    
+    Interned names let dict lookups on field names compare by identity.
+    Python 2 cannot intern `unicode`, so those are left alone.
+    """
+    if type(name) is str:
+        return intern(name)
+    return name
 
 
 def float2(s, default=0.0):
@@ -17,8 +17,13 @@
 from __future__ import with_statement
 from __future__ import unicode_literals
 
+import os
+import shutil
+import sqlite3
+import tempfile
+
 from nose.tools import assert_raises
-from norman import Database, Table
+from norman import Database, Table, Field, NotSet
 
 class TestDatabase(object):
 
@@ -60,3 +65,71 @@ class TestDatabase(object):
         r = self.db.add(Tb)
         assert r is Tb
         assert Tb in self.db
+
+class TestSqlite(object):
+
+    def setup(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'test.sqlite')
+        self.db = Database()
+
+        @self.db.add
+        class Town(Table):
+            name = Field()
+
+        @self.db.add
+        class Street(Table):
+            name = Field()
+            town = Field()
+            note = Field()
+
+        self.Town = Town
+        self.Street = Street
+
+    def teardown(self):
+        shutil.rmtree(self.dir)
+
+    def test_roundtrip(self):
+        'Test that references and unset values survive a round trip.'
+        t = self.Town(name='London')
+        self.Street(name='Baker st.', town=t)
+        self.db.tosqlite(self.path)
+        self.db.reset()
+        self.db.fromsqlite(self.path)
+        town, = self.Town.get()
+        street, = self.Street.get()
+        assert town.name == 'London'
+        assert street.name == 'Baker st.'
+        assert street.town is town
+        assert street.note is NotSet
+
+    def test_second_dump(self):
+        'Test that dumping again to the same file replaces the tables.'
+        self.Town(name='London')
+        self.db.tosqlite(self.path)
+        self.db.reset()
+        t = self.Town(name='Paris')
+        self.Street(name='Rue de Rivoli', town=t, note='long')
+        self.db.tosqlite(self.path)
+        self.db.reset()
+        self.db.fromsqlite(self.path)
+        town, = self.Town.get()
+        street, = self.Street.get()
+        assert town.name == 'Paris'
+        assert street.town is town
+        assert street.note == 'long'
+
+    def test_other_tables_kept(self):
+        'Test that unrelated tables in an existing file are left alone.'
+        conn = sqlite3.connect(self.path)
+        conn.executescript("""
+            CREATE TABLE "other" ("field");
+            INSERT INTO "other" VALUES ('a value');
+        """)
+        conn.close()
+        self.Town(name='London')
+        self.db.tosqlite(self.path)
+        conn = sqlite3.connect(self.path)
+        rows = conn.execute('SELECT * FROM "other"').fetchall()
+        conn.close()
+        assert rows == [('a value',)]
@@ -17,13 +17,34 @@
 from __future__ import with_statement
 from __future__ import unicode_literals
 
+import os
+import uuid
+
+from nose.plugins.skip import SkipTest
 from nose.tools import assert_raises, with_setup
 from norman import tools
 from norman._database import Database
 
-from norman._dbconnector import JsonDBConnector
-from norman._field import Field
-from norman._table import Table
+from norman._dbconnector import JsonDBConnector, _is_uuid, _fast_uuid4
+from norman._field import Field, NotSet
+from norman._table import Table, TableMeta
+
+
+def test_is_uuid():
+    assert _is_uuid('7b6e18c4-4259-4da3-b44c-cb335e9d0929')
+    assert _is_uuid('7B6E18C4-4259-4DA3-B44C-CB335E9D0929')
+    assert not _is_uuid('7b6e18c4-4259-4da3-b44c-cb335e9d092')
+    assert not _is_uuid('7b6e18c4x4259-4da3-b44c-cb335e9d0929')
+    assert not _is_uuid('7b6e18c4-4259-4da3-b44c-cb335e9d092g')
+    assert not _is_uuid('7b6e18c4-4259-4da3-b44c-cb335e9d-929')
+    assert not _is_uuid('Sherlock Holmes')
+
+
+def test_fast_uuid4():
+    value = _fast_uuid4()
+    assert _is_uuid(value)
+    assert uuid.UUID(value).version == 4
+    assert value != _fast_uuid4()
 
 
 class TestDBConnector(object):
@@ -72,6 +93,7 @@ class TestDBConnector(object):
         json_connector = JsonDBConnector(self.db)
         dump = json_connector.export_dump()
         assert dump
+        assert type(dump) is str
 
 
     def test_json_import(self):
@@ -90,3 +112,138 @@ class TestDBConnector(object):
         assert a1.town is t1
 
 
+
+    def test_json_import_values(self):
+        'Non-string values are imported as they are.'
+        json_connector = JsonDBConnector(self.db)
+        init_dump = '{"addresses": [{"_uuid_": "7b6e18c4-4259-4da3-b44c-cb335e9d0929", "street": null, "town": "d2d3f8df-8ce5-40b0-8183-38084b198dc7"}], "persons": [{"_uuid_": "efc1ec5a-0ef3-4881-870a-bdf69651d7ff", "address": "7b6e18c4-4259-4da3-b44c-cb335e9d0929", "age": 35, "custno": 0, "name": "Sherlock Holmes"}], "towns": [{"_uuid_": "d2d3f8df-8ce5-40b0-8183-38084b198dc7", "name": "London"}]}'
+        json_connector.import_dump(init_dump)
+
+        p1 = list(self.Persons.get(name="Sherlock Holmes"))[0]
+        assert p1.age == 35
+        assert p1.custno is NotSet
+        assert p1.address.street is None
+
+    def test_json_import_cycle(self):
+        'Records which refer to each other are imported with their references.'
+        db = Database()
+
+        @db.add
+        class Node(Table):
+            name = Field()
+            other = Field()
+
+        a = Node(name='a')
+        b = Node(name='b', other=a)
+        a.other = b
+        c = Node(name='c')
+        c.other = c
+        d = Node(name='d', other=a)
+        dump = JsonDBConnector(db).export_dump()
+        Node.delete()
+        JsonDBConnector(db).import_dump(dump)
+
+        assert len(Node) == 4
+        a, = Node.get(name='a')
+        b, = Node.get(name='b')
+        c, = Node.get(name='c')
+        d, = Node.get(name='d')
+        assert a.other is b
+        assert b.other is a
+        assert c.other is c
+        assert d.other is a
+
+    def _pair_dump(self, count):
+        'Return a database and a dump of *count* pairs referring to each other.'
+        db = Database()
+
+        @db.add
+        class Node(Table):
+            other = Field()
+
+        for i in range(count):
+            a = Node()
+            a.other = Node(other=a)
+        dump = JsonDBConnector(db).export_dump()
+        Node.delete()
+        return db, Node, dump
+
+    def test_json_import_many_cycles(self):
+        'Many independent cycles are all imported.'
+        db, Node, dump = self._pair_dump(2000)
+        JsonDBConnector(db).import_dump(dump)
+        assert len(Node) == 4000
+        for node in Node:
+            assert node.other.other is node
+            assert node.other is not node
+
+    def test_json_import_cycles_speed(self):
+        'Importing cycles should scale linearly'
+        if not os.environ.get('RUN_PERF_TESTS'):
+            raise SkipTest('set RUN_PERF_TESTS to run timing tests')
+        import time
+        times = []
+        for count in (2000, 8000):
+            db, Node, dump = self._pair_dump(count)
+            start = time.time()
+            JsonDBConnector(db).import_dump(dump)
+            times.append(time.time() - start)
+        # Four times the records; quadratic behaviour would be about 16x
+        assert times[1] < times[0] * 8, times
+
+    def test_json_metaclass_subclass(self):
+        'References to tables with a derived metaclass are exported as UUIDs.'
+        class Meta2(TableMeta):
+            pass
+
+        db = Database()
+
+        @db.add
+        class Town(Table):
+            __metaclass__ = Meta2
+            name = Field()
+
+        @db.add
+        class Street(Table):
+            __metaclass__ = Meta2
+            name = Field()
+            town = Field()
+
+        Street(name='Baker st.', town=Town(name='London'))
+        dump = JsonDBConnector(db).export_dump()
+        assert 'object at' not in dump
+        Street.delete()
+        Town.delete()
+        JsonDBConnector(db).import_dump(dump)
+
+        s, = Street.get()
+        t, = Town.get()
+        assert s.town is t
+
+    def test_json_import_chain(self):
+        'Long chains of references do not hit the recursion limit.'
+        db = Database()
+
+        @db.add
+        class Nodes(Table):
+            parent = Field(index=True)
+
+        nodes = [Nodes(parent=None)]
+        for i in range(3000):
+            nodes.append(Nodes(parent=nodes[-1]))
+        dump = JsonDBConnector(db).export_dump()
+        Nodes.delete()
+        JsonDBConnector(db).import_dump(dump)
+
+        assert len(Nodes) == 3001
+        roots = Nodes.get(parent=None)
+        assert len(roots) == 1
+        depth = 0
+        node = roots.pop()
+        while True:
+            children = Nodes.get(parent=node)
+            if not children:
+                break
+            node = children.pop()
+            depth += 1
+        assert depth == 3000
@@ -22,6 +22,9 @@ class MockTable(object):
     _updateinstance = lambda: None
     validate = lambda: None
 
+    def __init__(self):
+        self._values = {}
+
 
 def test_NotSet():
     'Test that NotSet cannot be instantiated.'
@@ -47,6 +50,11 @@ class TestSingleField(object):
         assert f.default == 1
         assert f.readonly
 
+    def test_bad_kwargs(self):
+        'Test that unknown kwargs are rejected'
+        with assert_raises(TypeError):
+            Field(indexed=True)
+
     def test_storage(self):
         'Test that fields store data.'
         t = self.T()
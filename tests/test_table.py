@@ -18,29 +18,43 @@ from __future__ import with_statement
 from __future__ import unicode_literals
 
 import collections
-import weakref
-import timeit
+import gc
+import os
+from functools import partial
 
+from nose.plugins.skip import SkipTest
 from nose.tools import assert_raises
-from norman import Table, Field, NotSet, _table
+from norman import Table, Field, NotSet
 
 ###############################################################################
 # Some test data
 
 def convidx(table, index):
-    'Utility to convert an index (i.e. defaultdict with a weakset) to a dict'
-    r = [(value, set(table._instances[k] for k in keys)) \
-                for value, keys in table._indexes[index].items()]
-    return dict(a for a in r if a[1])
+    'Utility to convert an index (i.e. defaultdict with a set) to a dict'
+    inst = table._instances
+    idx = table._indexes[index]
+    return dict((value, set(inst[k] for k in keys))
+                for value, keys in idx.items() if keys)
+
+def assert_idx_has(table, index, mapping):
+    'Assert that an index maps exactly the values in mapping to those records'
+    idx = table._indexes[index]
+    inst = table._instances
+    values = set(v for v, keys in idx.items() if keys)
+    assert values == set(mapping), convidx(table, index)
+    for value, records in mapping.items():
+        keys = idx[value]
+        assert len(keys) == len(records), convidx(table, index)
+        for record in records:
+            assert record._key in keys and inst[record._key] is record
 
 def test_conv_index():
-    class K(object): pass
-    k1 = K()
-    k2 = K()
+    k1 = 0
+    k2 = 1
     class T(object):
         _instances = {k1: 'i1', k2: 'i2'}
-        _indexes = {'f1': collections.defaultdict(weakref.WeakSet),
-                    'f2': collections.defaultdict(weakref.WeakSet)}
+        _indexes = {'f1': collections.defaultdict(set),
+                    'f2': collections.defaultdict(set)}
     T._indexes['f1']['a'].add(k1)
     T._indexes['f1']['a'].add(k2)
     T._indexes['f1']['b'].add(k1)
@@ -48,42 +62,38 @@ def test_conv_index():
     assert convidx(T, 'f1') == {'a': set(['i1', 'i2']), 'b': set(['i1'])}
     assert convidx(T, 'f2') == {}
 
-class Test_I(object):
-
-    def test_hash(self):
-        'Test that _I is hashable.'
-        i1 = _table._I()
-        i2 = _table._I()
-        h1 = hash(i1)
-        h2 = hash(i2)
-        assert h1 != h2
-
-    def test_weakref(self):
-        'Test that _I can have a weak ref.'
-        i = _table._I()
-        ref = weakref.ref(i)
-        assert ref() is i
-        del i
-        assert ref() is None
-
-
 class TestTable(object):
 
     def setup(self):
+        # Records are created in tight loops, collection is left to teardown
+        gc.disable()
         class T(Table):
+            __slots__ = ()
             oid = Field(index=True)
             name = Field(index=True)
             age = Field()
         self.T = T
 
+    def teardown(self):
+        gc.enable()
+        self.T.delete()
+        gc.collect()
+
+    def _check_iter(self, rows, kw, expected):
+        'Check that iter and get match the rows at the *expected* positions.'
+        expected = frozenset(rows[i] for i in expected)
+        result = set(self.T.iter(**kw))
+        assert result == expected, result
+        assert self.T.get(**kw) == expected
+
     def test_init_empty(self):
         'Test initialisation with no arguments.'
         t = self.T()
         assert t.oid is NotSet
         assert t.name is NotSet
         assert t.age is NotSet
-        assert convidx(self.T, 'oid') == {NotSet: set([t])}, convidx(self.T, 'oid')
-        assert convidx(self.T, 'name') == {NotSet: set([t])}
+        assert_idx_has(self.T, 'oid', {NotSet: (t,)})
+        assert_idx_has(self.T, 'name', {NotSet: (t,)})
         assert 'age' not in t._indexes
 
     def test_init_single(self):
@@ -92,8 +102,8 @@ class TestTable(object):
         assert t.oid == 1, t.oid
         assert t.name is NotSet
         assert t.age is NotSet
-        assert convidx(self.T, 'oid') == {1: set([t])}, convidx(self.T, 'oid')
-        assert convidx(self.T, 'name') == {NotSet: set([t])}
+        assert_idx_has(self.T, 'oid', {1: (t,)})
+        assert_idx_has(self.T, 'name', {NotSet: (t,)})
         assert 'age' not in t._indexes
 
     def test_init_many(self):
@@ -102,8 +112,8 @@ class TestTable(object):
         assert t.oid == 1
         assert t.name is 'Mike'
         assert t.age is 23
-        assert convidx(self.T, 'oid') == {1: set([t])}
-        assert convidx(self.T, 'name') == {'Mike': set([t])}
+        assert_idx_has(self.T, 'oid', {1: (t,)})
+        assert_idx_has(self.T, 'name', {'Mike': (t,)})
         assert 'age' not in t._indexes
 
     def test_init_bad_kwargs(self):
@@ -129,6 +139,14 @@ class TestTable(object):
         assert T.oid.index
         assert sorted(T._indexes.keys()) == ['name', 'oid']
 
+    def test_overridden_field(self):
+        'Test that fields redefined in a subclass take precedence.'
+        class T(self.T):
+            name = Field(unique=True)
+        assert T._fields['name'] is T.name
+        assert T.name.unique
+        assert not self.T.name.unique
+
     def test_len(self):
         'len(Table) returns the number of records.'
         self.T(oid=1)
@@ -142,58 +160,113 @@ class TestTable(object):
         t2 = self.T(oid=2)
         assert t1 in self.T
 
+    def test_contains_other_table(self):
+        'Test that records are not found in another table with the same key.'
+        class Other(Table):
+            oid = Field()
+        t = self.T(oid=1)
+        o = Other(oid=1)
+        assert t._key == o._key
+        assert o not in self.T
+        assert t not in Other
+
     def test_contains_method(self):
         'Test the `contains` method.'
-        t1 = self.T(oid=1)
+        t1 = self.T(oid=1, age=5)
         t2 = self.T(oid=2)
         assert self.T.contains(oid=1)
         assert not self.T.contains(oid=3)
+        assert self.T.contains(oid=1, name=NotSet)
+        assert not self.T.contains(oid=1, name='a')
+        assert self.T.contains(age=5)
+        assert not self.T.contains(age=6)
+        assert self.T.contains(oid=1, age=5)
+        assert not self.T.contains(oid=2, age=5)
 
     def test_iter(self):
         'Test iter(table)'
         t1 = self.T(oid=1)
         t2 = self.T(oid=2)
-        result = set(i for i in self.T)
+        result = set(self.T)
         assert result == set([t1, t2])
 
     def test_iter_method(self):
         'Test that iter returns the matching records.'
-        p1 = self.T(oid=1)
-        p2 = self.T(oid=2)
-        p3 = self.T(oid=3)
-        p = set(self.T.iter(oid=1))
-        assert p == set([p1]), p
+        rows = [self.T(oid=1), self.T(oid=2), self.T(oid=3)]
+        self._check_iter(rows, {'oid': 1}, [0])
+        self._check_iter(rows, {'oid': 4}, [])
 
     def test_iter_other_attr(self):
         'Test that iter finds matches for non-indexed fields.'
+        rows = [self.T(oid=1, name='Mike', age=23),
+                self.T(oid=2, name='Mike', age=22),
+                self.T(oid=3, name='Mike', age=23)]
+        self._check_iter(rows, {'age': 23}, [0, 2])
+        self._check_iter(rows, {'name': 'Mike', 'age': 22}, [1])
+
+    def test_iter_plan(self):
+        'Test that query plans are cached by the set of keywords.'
+        plan = self.T._plan({'oid': 1, 'age': 23})
+        assert plan == (('oid',), ('age',))
+        assert self.T._plan({'age': 22, 'oid': 2}) is plan
+
+    def test_get(self):
+        rows = [self.T(oid=1), self.T(oid=2), self.T(oid=3)]
+        self._check_iter(rows, {}, [0, 1, 2])
+
+    def test_count(self):
+        'Test that count returns the number of matching records.'
         p1 = self.T(oid=1, name='Mike', age=23)
         p2 = self.T(oid=2, name='Mike', age=22)
         p3 = self.T(oid=3, name='Mike', age=23)
-        p = set(self.T.iter(age=23))
-        assert p == set([p1, p3]), p
-
-    def test_get(self):
-        p1 = self.T(oid=1)
-        p2 = self.T(oid=2)
-        p3 = self.T(oid=3)
-        p = self.T.get(oid=1)
-        assert p == set([p1])
+        assert self.T.count() == 3
+        assert self.T.count(oid=1) == 1
+        assert self.T.count(age=23) == 2
+        assert self.T.count(age=24) == 0
 
     def test_indexes_updated(self):
         'Test that indexes are updated when a value changes'
         t = self.T(oid=1)
-        i = convidx(self.T, 'oid')
-        assert i == {1: set([t])}, i
+        assert_idx_has(self.T, 'oid', {1: (t,)})
+        t.oid = 2
+        assert_idx_has(self.T, 'oid', {2: (t,)})
 
     def test_index_speed(self):
         'Getting indexed fields should be ten times faster'
+        if not os.environ.get('RUN_PERF_TESTS'):
+            raise SkipTest('set RUN_PERF_TESTS to run timing tests')
+        import timeit
         count = 500
-        for i in xrange(count):
-            self.T(oid=i, name='Mike', age=int(i % 10))
-        number = 100000
-        fast = timeit.timeit(lambda: self.T.iter(id=300), number=number)
-        slow = timeit.timeit(lambda: self.T.iter(age=5), number=number)
-        assert fast * 10 > slow
+        self.T._bulk(dict(oid=i, name='Mike', age=i % 10)
+                     for i in xrange(count))
+        # get consumes the matches, so the lookups themselves are timed
+        number = 1000
+        fast = timeit.timeit(partial(self.T.get, oid=300), number=number)
+        slow = timeit.timeit(partial(self.T.get, age=5), number=number)
+        assert fast * 10 < slow, (fast, slow)
+
+    def test_bulk(self):
+        'Test creating records with _bulk.'
+        t1, t2 = self.T._bulk([{'oid': 1, 'age': 20}, {'name': 'Bob'}])
+        assert set(self.T) == set([t1, t2])
+        assert (t1.oid, t1.name, t1.age) == (1, NotSet, 20)
+        assert (t2.oid, t2.name, t2.age) == (NotSet, 'Bob', NotSet)
+        assert convidx(self.T, 'oid') == {1: set([t1]), NotSet: set([t2])}
+        assert convidx(self.T, 'name') == {NotSet: set([t1]), 'Bob': set([t2])}
+        with assert_raises(AttributeError):
+            self.T._bulk([{'bad': 1}])
+
+    def test_bulk_invalid(self):
+        'Test that _bulk validates records unless told not to.'
+        class T(self.T):
+            def validate(self):
+                assert self.oid != 1
+        with assert_raises(AssertionError):
+            T._bulk([{'oid': 2}, {'oid': 1}])
+        assert len(T) == 0
+        assert convidx(T, 'oid') == {}
+        t, = T._bulk([{'oid': 1}], validate=False)
+        assert set(T) == set([t])
 
     def test_delete_instance(self):
         'Test deleting a single instance'
@@ -225,6 +298,25 @@ class TestTable(object):
         assert p2 not in self.T
         assert p3 in self.T
 
+    def test_delete_instances_attribute(self):
+        'Test deleting the instances which match an attribute'
+        p1 = self.T(oid=1, name='Mike', age=23)
+        p2 = self.T(oid=2, name='Mike', age=22)
+        p3 = self.T(oid=3, name='Mike', age=23)
+        self.T.delete([p1, p1, p2], age=23)
+        assert p1 not in self.T
+        assert p2 in self.T
+        assert p3 in self.T
+        assert len(self.T) == 2
+
+    def test_delete_updates_index(self):
+        'Deleted records are removed from the indexes.'
+        p1 = self.T(oid=1, name='Mike', age=23)
+        p2 = self.T(oid=2, name='Mike', age=22)
+        self.T.delete(p1)
+        assert_idx_has(self.T, 'oid', {2: (p2,)})
+        assert_idx_has(self.T, 'name', {'Mike': (p2,)})
+
     def test_delete_all(self):
         'Test that delete with no args clears all instances.'
         p1 = self.T(oid=1, name='Mike', age=23)
@@ -245,6 +337,52 @@ class TestTable(object):
             t.oid = 1
         assert t.oid == 2
 
+    def test_set_invalid_inherited(self):
+        'Test that validate is inherited by subclasses.'
+        class T(self.T):
+            def validate(self):
+                assert self.oid != 1
+
+        class U(T):
+            pass
+
+        u = U()
+        u.oid = 2
+        with assert_raises(ValueError):
+            u.oid = 1
+        assert u.oid == 2
+
+    def test_validate_staticmethod(self):
+        'Test that validate may be a staticmethod.'
+        calls = []
+        class T(self.T):
+            @staticmethod
+            def validate():
+                calls.append(1)
+
+        t = T()
+        t.oid = 2
+        assert t.oid == 2
+        assert len(calls) == 2
+
+    def test_validate_replaced(self):
+        'Test that assigning validate to a table is used by setattr.'
+        class U(self.T):
+            pass
+
+        t = self.T(oid=2)
+        u = U(oid=2)
+        def validate(self):
+            assert self.oid != 1
+        self.T.validate = validate
+        with assert_raises(ValueError):
+            t.oid = 1
+        with assert_raises(ValueError):
+            u.oid = 1
+        del self.T.validate
+        t.oid = 1
+        u.oid = 1
+
     def test_validate_changes(self):
         'Test the case where validate changes a value.'
         class T(self.T):
@@ -256,6 +394,38 @@ class TestTable(object):
         t.name = 'abc'
         assert t.name == 'ABC'
 
+    def test_validate_changes_index(self):
+        'Test that the index holds the value stored by validate.'
+        class T(self.T):
+            def validate(self):
+                if self.oid == 5:
+                    self.oid = 6
+
+        t = T(oid=1)
+        t.oid = 5
+        assert t.oid == 6
+        assert_idx_has(T, 'oid', {6: (t,)})
+        assert T.get(oid=5) == set()
+        assert not T.contains(oid=5)
+        assert T.count(oid=5) == 0
+        assert T.get(oid=6) == set([t])
+
+    def test_validate_changes_unique(self):
+        'Test that a value rewritten by validate does not stay unique.'
+        class U(Table):
+            k = Field(unique=True)
+            def validate(self):
+                if self.k == 5:
+                    self.k = 6
+
+        u1 = U()
+        u1.k = 5
+        assert u1.k == 6
+        u1.k = 7
+        u2 = U(k=5)
+        assert u2.k == 6
+        assert_idx_has(U, 'k', {7: (u1,), 6: (u2,)})
+
     def test_validate_changes_fails(self):
         'Test the case where validate changes a value then fails.'
         class T(self.T):
@@ -275,6 +445,7 @@ class TestUnique(object):
 
     def setup(self):
         class T(Table):
+            __slots__ = ()
             oid = Field(unique=True)
         self.T = T
 
@@ -288,6 +459,22 @@ class TestUnique(object):
         with assert_raises(ValueError):
             t2 = self.T(oid=3)
 
+    def test_unique_init_index(self):
+        'A duplicate record which fails to initialise is not indexed.'
+        t1 = self.T(oid=3)
+        with assert_raises(ValueError):
+            self.T(oid=3)
+        assert_idx_has(self.T, 'oid', {3: (t1,)})
+
+    def test_unique_bulk(self):
+        'Test bulk loading a duplicate record.'
+        t1, t2 = self.T._bulk([{'oid': 1}, {'oid': 2}])
+        with assert_raises(ValueError):
+            self.T._bulk([{'oid': 3}, {'oid': 1}])
+        # The whole call is rolled back
+        assert set(self.T) == set([t1, t2])
+        assert_idx_has(self.T, 'oid', {1: (t1,), 2: (t2,)})
+
     def test_unique_set(self):
         'Test setting a record to a duplicate value.'
         t1 = self.T(oid=1)
@@ -317,6 +504,7 @@ class TestValidateDelete(object):
 
     def setup(self):
         class T(Table):
+            __slots__ = ()
             value = Field()
             def validate_delete(self):
                 assert self.value > 1